@@ -1,33 +1,46 @@
 import asyncio
+import json
 import os
+from typing import Literal
 
+import httpx
 from mcp.server.fastmcp import FastMCP
 from mcp.server.transport_security import TransportSecuritySettings
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Import from supermarkets package
 from src.supermarkets import (
     coles_search_products,
     coles_extract_products,
     COLES_DEFAULT_STORE_ID,
+    Product,
     woolworths_search_products,
 )
 
 # ---- Transport Security (fixes 421 / Invalid Host header on Render) ----
-# Allow your Render public hostname. This prevents DNS-rebinding protection
-# from rejecting legitimate requests. See MCP Python SDK guidance. :contentReference[oaicite:1]{index=1}
-RENDER_HOST = "coles-woolworths-mcp-server.onrender.com"
-
-from mcp.server.transport_security import TransportSecuritySettings
-
+# Allow your public hostname(s). This prevents DNS-rebinding protection
+# from rejecting legitimate requests. See MCP Python SDK guidance.
+# Override with a comma-separated MCP_ALLOWED_HOSTS when deploying elsewhere.
 RENDER_HOST = "coles-woolworths-mcp-server.onrender.com"
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.getenv("MCP_ALLOWED_HOSTS", RENDER_HOST).split(",")
+    if host.strip()
+]
 
 transport_security = TransportSecuritySettings(
     enable_dns_rebinding_protection=True,
     allowed_hosts=[
         # allow both styles
-        RENDER_HOST,
-        f"{RENDER_HOST}:*",
-        f"{RENDER_HOST}:443",
+        *(
+            pattern
+            for host in ALLOWED_HOSTS
+            for pattern in (host, f"{host}:*", f"{host}:443")
+        ),
 
         # local dev
         "localhost",
@@ -38,7 +51,7 @@ transport_security = TransportSecuritySettings(
         "0.0.0.0:*",
     ],
     allowed_origins=[
-        f"https://{RENDER_HOST}",
+        *(f"https://{host}" for host in ALLOWED_HOSTS),
         "http://localhost",
         "http://localhost:*",
         "http://127.0.0.1",
@@ -46,6 +59,35 @@ transport_security = TransportSecuritySettings(
     ],
 )
 
+# ---- Shared HTTP client ----
+# A single pooled HTTP/2 client lets warm tool calls reuse TCP/TLS connections
+# and multiplex concurrent requests to the same store over one socket.
+_client: httpx.AsyncClient | None = None
+_client_lock = asyncio.Lock()
+
+
+async def get_client() -> httpx.AsyncClient:
+    """Return the shared httpx client, creating it on first use."""
+    global _client
+    async with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                timeout=10.0,
+            )
+        return _client
+
+
+async def close_client() -> None:
+    """Close the shared httpx client, if one has been created."""
+    global _client
+    async with _client_lock:
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+
+
 # Initialize FastMCP server (do NOT hardcode host='localhost' for remote deployment)
 mcp = FastMCP(
     "supermarket-mcp",
@@ -53,11 +95,41 @@ mcp = FastMCP(
 )
 
 
+def _to_json(obj) -> str:
+    """Serialize obj to a JSON string, encoding Product instances as objects."""
+    if orjson is not None:
+        # orjson serializes dataclasses natively in a single C-level call
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, default=Product.to_dict)
+
+
+def products_to_json(products: list[Product]) -> str:
+    """Serialize products as a JSON array."""
+    return _to_json(products)
+
+
+def error_to_json(message: str, response_text: str = "") -> str:
+    """Serialize a failed search as a JSON error object."""
+    return _to_json({"error": message, "response_text": response_text})
+
+
+def format_products(products: list[Product]) -> str:
+    """Render products as text blocks separated by '---'."""
+    return "\n---\n".join(
+        f"Name: {p.name}\n"
+        f"Price: {'$%.2f' % p.price if p.price is not None else 'N/A'}\n"
+        f"Unit: {p.unit or 'N/A'}\n"
+        f"Store: {p.store}"
+        for p in products
+    )
+
+
 @mcp.tool()
 async def get_coles_products(
     query: str,
     store_id: str = COLES_DEFAULT_STORE_ID,
     limit: int = 10,
+    format: Literal["text", "json"] = "text",
 ) -> str:
     """Search for products at Coles.
 
@@ -65,74 +137,129 @@ async def get_coles_products(
         query: The product search query.
         store_id: The Coles store ID to search in.
         limit: Maximum number of products to return.
+        format: "text" for readable blocks, or "json" for a JSON array of
+            products with name, price, unit and store fields. On failure,
+            json mode returns an object with "error" and "response_text"
+            keys instead of an array.
     """
     try:
-        search_results = await asyncio.to_thread(
-            coles_search_products,
+        search_results = await coles_search_products(
             query=query,
+            client=await get_client(),
             store_id=store_id,
         )
 
         if search_results.get("status") == "error":
-            return (
-                f"Error fetching Coles products: {search_results.get('message', 'Unknown error')}\n"
-                f"Response: {search_results.get('response_text', '')}"
-            )
-
-        products = await asyncio.to_thread(coles_extract_products, search_results)
+            message = f"Error fetching Coles products: {search_results.get('message', 'Unknown error')}"
+            response_text = search_results.get("response_text", "")
+            if format == "json":
+                return error_to_json(message, response_text)
+            return f"{message}\nResponse: {response_text}"
 
+        products = coles_extract_products(search_results)
         products = products[: min(limit, len(products))]
 
+        if format == "json":
+            return products_to_json(products)
+
         if not products:
             return f"No products found at Coles for '{query}'."
 
-        formatted_products = []
-        for p in products:
-            price_str = f"${p['price']:.2f}" if p.get("price") is not None else "N/A"
-            unit_str = p.get("unit") or "N/A"
-            formatted_products.append(
-                f"Name: {p.get('name','')}\nPrice: {price_str}\nUnit: {unit_str}\nStore: {p.get('store','')}"
-            )
-        return "\n---\n".join(formatted_products)
+        return format_products(products)
 
     except Exception as e:
-        return f"An unexpected error occurred in get_coles_products: {str(e)}"
+        message = f"An unexpected error occurred in get_coles_products: {str(e)}"
+        return error_to_json(message) if format == "json" else message
 
 
 @mcp.tool()
-async def get_woolworths_products(query: str, limit: int = 10) -> str:
+async def get_woolworths_products(
+    query: str,
+    limit: int = 10,
+    format: Literal["text", "json"] = "text",
+) -> str:
     """Search for products at Woolworths.
 
     Args:
         query: The product search query.
         limit: Maximum number of products to return.
+        format: "text" for readable blocks, or "json" for a JSON array of
+            products with name, price, unit and store fields. On failure,
+            json mode returns an object with "error" and "response_text"
+            keys instead of an array.
     """
     try:
-        search_results = await asyncio.to_thread(woolworths_search_products, query=query)
+        search_results = await woolworths_search_products(
+            query=query,
+            client=await get_client(),
+            limit=limit,
+        )
 
         if search_results.get("status") == "error":
-            return (
-                f"Error fetching Woolworths products: {search_results.get('message', 'Unknown error')}\n"
-                f"Response: {search_results.get('response_text', '')}"
-            )
+            message = f"Error fetching Woolworths products: {search_results.get('message', 'Unknown error')}"
+            response_text = search_results.get("response_text", "")
+            if format == "json":
+                return error_to_json(message, response_text)
+            return f"{message}\nResponse: {response_text}"
 
         products = search_results.get("products", [])
         products = products[: min(limit, len(products))]
 
+        if format == "json":
+            return products_to_json(products)
+
         if not products:
             return f"No products found at Woolworths for '{query}'."
 
-        formatted_products = []
-        for p in products:
-            price_str = f"${p['price']:.2f}" if p.get("price") is not None else "N/A"
-            unit_str = p.get("unit") or "N/A"
-            formatted_products.append(
-                f"Name: {p.get('name','')}\nPrice: {price_str}\nUnit: {unit_str}\nStore: {p.get('store','')}"
-            )
-        return "\n---\n".join(formatted_products)
+        return format_products(products)
 
     except Exception as e:
-        return f"An unexpected error occurred in get_woolworths_products: {str(e)}"
+        message = f"An unexpected error occurred in get_woolworths_products: {str(e)}"
+        return error_to_json(message) if format == "json" else message
+
+
+@mcp.tool()
+async def get_all_supermarket_products(
+    query: str,
+    store_id: str = COLES_DEFAULT_STORE_ID,
+    limit: int = 10,
+) -> str:
+    """Search for products at both Coles and Woolworths concurrently.
+
+    Args:
+        query: The product search query.
+        store_id: The Coles store ID to search in.
+        limit: Maximum number of products to return per store.
+    """
+    coles_task = asyncio.create_task(
+        get_coles_products(query, store_id=store_id, limit=limit)
+    )
+    woolworths_task = asyncio.create_task(get_woolworths_products(query, limit=limit))
+    results = await asyncio.gather(coles_task, woolworths_task, return_exceptions=True)
+
+    sections = []
+    for store_label, result in zip(("Coles", "Woolworths"), results):
+        if isinstance(result, BaseException):
+            result = f"An unexpected error occurred while searching {store_label}: {str(result)}"
+        sections.append(f"=== {store_label} ===\n{result}")
+    return "\n\n".join(sections)
+
+
+async def serve(transport: str) -> None:
+    """Run the MCP server and close the shared HTTP client on process shutdown.
+
+    The client is shared by every MCP session, so it is closed here rather than
+    in the per-session FastMCP lifespan.
+    """
+    try:
+        if transport == "stdio":
+            await mcp.run_stdio_async()
+        elif transport == "sse":
+            await mcp.run_sse_async()
+        else:
+            await mcp.run_streamable_http_async()
+    finally:
+        await close_client()
 
 
 if __name__ == "__main__":
@@ -140,7 +267,7 @@ if __name__ == "__main__":
     # On Render you will start it via:
     #   fastmcp run main.py --transport http|sse --host 0.0.0.0 --port $PORT
     transport = os.getenv("FASTMCP_TRANSPORT", "http")
-    host = os.getenv("FASTMCP_HOST", "127.0.0.1")
-    port = int(os.getenv("FASTMCP_PORT", "8000"))
+    mcp.settings.host = os.getenv("FASTMCP_HOST", "127.0.0.1")
+    mcp.settings.port = int(os.getenv("FASTMCP_PORT", "8000"))
 
-    mcp.run(transport=transport, host=host, port=port)
+    asyncio.run(serve(transport))
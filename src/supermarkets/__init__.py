@@ -2,6 +2,9 @@
 Export necessary functions from supermarket modules to enable cleaner imports.
 """
 
+# Export the shared product model
+from .product import Product
+
 # Export from coles.py
 from .coles import (
     search_products as coles_search_products,
@@ -15,6 +18,7 @@ from .woolworths import (
 )
 
 __all__ = [
+    "Product",
     "coles_search_products",
     "coles_extract_products", 
     "COLES_DEFAULT_STORE_ID",
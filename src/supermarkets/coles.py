@@ -1,18 +1,35 @@
 from typing import Dict, Any, List
+import asyncio
 import re
-import requests
+import httpx
 import json
+from cachetools import TTLCache
 from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
 
+from .product import Product
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 load_dotenv()
 
 # Store information
-STORE_NAME = "coles"
+STORE_NAME = sys.intern("coles")
 STORE_URL = "https://www.coles.com.au"
 API_URL = "https://www.coles.com.au/api/bff/products"
 
+# Request headers shared by every API call
+HEADERS = {
+    "Accept": "application/json",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
 # Coles API key - provided by the user
 # In a production environment, this should be stored securely, not hardcoded
 API_KEY = os.getenv("COLES_API_KEY")
@@ -20,6 +37,15 @@ API_KEY = os.getenv("COLES_API_KEY")
 # Default store ID - provided in the example URL
 DEFAULT_STORE_ID = "0584"
 
+# Cap on concurrent requests to the Coles API, to stay clear of rate limiting
+MAX_INFLIGHT = int(os.getenv("COLES_MAX_INFLIGHT", "8"))
+_COLES_SEM = asyncio.Semaphore(MAX_INFLIGHT)
+
+# Short-lived cache of successful searches (extracted products only), keyed on (normalised query, store ID)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+_search_cache = TTLCache(maxsize=512, ttl=CACHE_TTL_SECONDS)
+_search_cache_lock = asyncio.Lock()
+
 def get_store_info() -> Dict[str, Any]:
     """
     Get information about the Coles store.
@@ -35,18 +61,25 @@ def get_store_info() -> Dict[str, Any]:
         "default_store_id": DEFAULT_STORE_ID
     }
 
-def search_products(query: str, store_id: str = DEFAULT_STORE_ID, limit: int = 10) -> Dict[str, Any]:
+async def search_products(query: str, client: httpx.AsyncClient, store_id: str = DEFAULT_STORE_ID, limit: int = 10) -> Dict[str, Any]:
     """
     Search for products using the Coles API.
     
     Args:
         query (str): The search query
+        client (httpx.AsyncClient): The shared HTTP client to issue the request on
         store_id (str, optional): The store ID to search in. Defaults to DEFAULT_STORE_ID.
         limit (int, optional): The maximum number of results to return. Defaults to 10.
     
     Returns:
-        Dict[str, Any]: The search results
+        Dict[str, Any]: The search results, with the extracted products under "products"
     """
+    cache_key = (query.lower().strip(), store_id)
+    async with _search_cache_lock:
+        cached_results = _search_cache.get(cache_key)
+    if cached_results is not None:
+        return cached_results
+
     try:
         # Use the exact URL format provided by the user
         search_url = f"{API_URL}/search"
@@ -61,15 +94,12 @@ def search_products(query: str, store_id: str = DEFAULT_STORE_ID, limit: int = 1
             "authenticated": "false",
             "subscription-key": API_KEY
         }
-        
-        # Set up the headers
-        headers = {
-            "Accept": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        # httpx would send None as an empty value; omit unset parameters instead
+        search_params = {key: value for key, value in search_params.items() if value is not None}
         
         # Make the API request
-        response = requests.get(search_url, params=search_params, headers=headers)
+        async with _COLES_SEM:
+            response = await client.get(search_url, params=search_params, headers=HEADERS)
         
         # Check if the request was successful
         if response.status_code != 200:
@@ -79,15 +109,22 @@ def search_products(query: str, store_id: str = DEFAULT_STORE_ID, limit: int = 1
                 "response_text": response.text
             }
         
-        # Parse the JSON response
-        response_data = response.json()
+        # Parse the JSON response straight from the raw bytes
+        response_data = _json_loads(response.content)
         
-        return {
+        # Extract the products now so the cache holds them rather than the full API payload
+        products = _parse_products(response_data)
+        
+        search_results = {
             "status": "success",
             "query": query,
             "store_id": store_id,
-            "response_data": response_data
+            "products": products,
+            "product_count": len(products)
         }
+        async with _search_cache_lock:
+            _search_cache[cache_key] = search_results
+        return search_results
     except Exception as e:
         return {
             "status": "error",
@@ -110,22 +147,32 @@ def parse_price(price_text: str) -> float:
         return float(price_match.group(1))
     return None
 
-def extract_products(search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+def extract_products(search_results: Dict[str, Any]) -> List[Product]:
     """
     Extract product information from search results.
     
     Args:
-        search_results (Dict[str, Any]): The search results from the Coles API
+        search_results (Dict[str, Any]): The search results from search_products
     
     Returns:
-        List[Dict[str, Any]]: The extracted product information
+        List[Product]: The extracted product information
     """
-    products = []
-    
     if search_results["status"] != "success":
-        return products
+        return []
+    
+    return search_results["products"]
+
+def _parse_products(response_data: Dict[str, Any]) -> List[Product]:
+    """
+    Parse product information out of a Coles API response.
     
-    response_data = search_results["response_data"]
+    Args:
+        response_data (Dict[str, Any]): The decoded JSON response from the Coles API
+    
+    Returns:
+        List[Product]: The extracted product information
+    """
+    products = []
     
     # Check if the response contains products
     if "results" in response_data and response_data["results"]:
@@ -186,12 +233,12 @@ def extract_products(search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
                         unit = "pack"
                         break
                 
-                products.append({
-                    "name": name,
-                    "price": float(price) if price is not None else None,
-                    "unit": unit,
-                    "store": STORE_NAME
-                })
+                products.append(Product(
+                    name=name,
+                    price=float(price) if price is not None else None,
+                    unit=unit,
+                    store=STORE_NAME
+                ))
             except Exception as e:
                 continue
     
@@ -210,6 +257,10 @@ coles_store = {
     "extract_products": extract_products
 }
 
+async def _main(query: str) -> Dict[str, Any]:
+    async with httpx.AsyncClient(http2=True) as client:
+        return await search_products(query, client)
+
 if __name__ == "__main__":
     # Example search query
     query = "juice"
@@ -219,7 +270,7 @@ if __name__ == "__main__":
     print(f"Store Info: {store_info}")
     
     # Search for products
-    search_results = search_products(query)
+    search_results = asyncio.run(_main(query))
     
     # Extract products from search results
     products = extract_products(search_results)
@@ -230,7 +281,7 @@ if __name__ == "__main__":
     
     # Print each product
     for product in products:
-        print(f"\nProduct: {product['name']}")
-        print(f"Price: ${product['price']:.2f}" if product['price'] else "Price: N/A")
-        print(f"Unit: {product['unit']}")
-        print(f"Store: {product['store']}")
+        print(f"\nProduct: {product.name}")
+        print(f"Price: ${product.price:.2f}" if product.price else "Price: N/A")
+        print(f"Unit: {product.unit}")
+        print(f"Store: {product.store}")
@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+@dataclass(slots=True)
+class Product:
+    """
+    A product extracted from a supermarket search.
+    
+    Attributes:
+        name (str): The product name
+        price (Optional[float]): The current price, or None if unavailable
+        unit (str): The normalised unit (e.g. "kg", "L", "each"), or an empty string
+        store (str): The store the product was found at
+    """
+    name: str
+    price: Optional[float]
+    unit: str
+    store: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the product to a plain dictionary.
+        
+        Returns:
+            Dict[str, Any]: The product fields keyed by name
+        """
+        return {
+            "name": self.name,
+            "price": self.price,
+            "unit": self.unit,
+            "store": self.store
+        }
@@ -1,13 +1,76 @@
 from typing import Dict, Any, List, Optional
+import asyncio
 import re
-import requests
+import httpx
 import json
+import os
+import sys
+from functools import lru_cache
+from urllib.parse import quote_plus
+from cachetools import TTLCache
+
+from .product import Product
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+else:
+    # The pure-Python ijson backends are slower than a full orjson parse; only stream with the C backend
+    if ijson.backend_name != "yajl2_c":
+        ijson = None
 
 # Store information
-STORE_NAME = "woolworths"
+STORE_NAME = sys.intern("woolworths")
 STORE_URL = "https://www.woolworths.com.au"
 API_URL = "https://www.woolworths.com.au/apis/ui/Search/products"
 
+# Request headers shared by every API call
+HEADERS = {
+    "Accept": "application/json",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Cap on concurrent requests to the Woolworths API, to stay clear of rate limiting
+MAX_INFLIGHT = int(os.getenv("WOOL_MAX_INFLIGHT", "8"))
+_WOOL_SEM = asyncio.Semaphore(MAX_INFLIGHT)
+
+# Responses larger than this (in bytes) are stream-parsed with ijson instead of fully decoded
+STREAM_PARSE_THRESHOLD = 256 * 1024
+
+# Short-lived cache of successful searches, keyed on (normalised query, limit)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+_search_cache = TTLCache(maxsize=512, ttl=CACHE_TTL_SECONDS)
+_search_cache_lock = asyncio.Lock()
+
+# Unit tokens, matched only when not embedded in a longer word (e.g. "500g", "1.5L", "6pk").
+# Unit fields are classified in batches: fields are joined with _FIELD_SEP, products with
+# _RECORD_SEP, and the regex also matches both separators so one scan can track where it is.
+_FIELD_SEP = "\x1e"
+_RECORD_SEP = "\x1f"
+_UNIT_RE = re.compile(
+    r'[\x1e\x1f]|(?<![a-z])('
+    r'kgs?|kilograms?|grams?|g|mls?|millilitres?|milliliters?|litres?|liters?|ltrs?|l|each|ea|packs?|pk'
+    r')(?![a-z])',
+    re.IGNORECASE,
+)
+_UNIT_MAP = {
+    "kg": "kg", "kgs": "kg", "kilogram": "kg", "kilograms": "kg",
+    "g": "g", "gram": "g", "grams": "g",
+    "ml": "ml", "mls": "ml", "millilitre": "ml", "millilitres": "ml", "milliliter": "ml", "milliliters": "ml",
+    "l": "L", "litre": "L", "litres": "L", "liter": "L", "liters": "L", "ltr": "L", "ltrs": "L",
+    "each": "each", "ea": "each",
+    "pack": "pack", "packs": "pack", "pk": "pack",
+}
+# When a field mentions several units (e.g. "6 pack x 1.25L"), the lowest rank wins
+_UNIT_RANK = {"kg": 0, "g": 1, "ml": 2, "L": 3, "each": 4, "pack": 5}
+
 def get_store_info() -> Dict[str, Any]:
     """
     Get information about the Woolworths store.
@@ -21,6 +84,7 @@ def get_store_info() -> Dict[str, Any]:
         "api_url": API_URL
     }
 
+@lru_cache(maxsize=1024)
 def format_api_url(query: str) -> str:
     """
     Format the API URL for a query.
@@ -31,32 +95,72 @@ def format_api_url(query: str) -> str:
     Returns:
         str: The formatted API URL
     """
-    # Replace spaces with plus signs
-    formatted_query = query.replace(" ", "+")
-    return f"{API_URL}?searchTerm={formatted_query}"
+    # Encode spaces as plus signs and escape reserved characters such as "&" and "#"
+    return f"{API_URL}?searchTerm={quote_plus(query)}"
+
+def _classify_units(unit_fields: List[tuple]) -> List[str]:
+    """
+    Detect the normalised unit for a batch of products in a single regex pass.
+    
+    Args:
+        unit_fields (List[tuple]): Per product, the unit-bearing field values in priority order
+            (non-strings are ignored)
+    
+    Returns:
+        List[str]: The unit for each product, or an empty string if none was found
+    """
+    units = [""] * len(unit_fields)
+    buffer = _RECORD_SEP.join(
+        _FIELD_SEP.join(field if isinstance(field, str) else "" for field in fields)
+        for fields in unit_fields
+    )
+    # Fields are laid out in priority order: the first field with any unit decides,
+    # and within that field the best-ranked unit wins
+    found_in_field = [None] * len(unit_fields)
+    index = 0
+    field = 0
+    for match in _UNIT_RE.finditer(buffer):
+        token = match.group(1)
+        if token is None:
+            if match.group() == _RECORD_SEP:
+                index += 1
+                field = 0
+            else:
+                field += 1
+            continue
+        unit = _UNIT_MAP[token.lower()]
+        if found_in_field[index] is None or (
+            found_in_field[index] == field and _UNIT_RANK[unit] < _UNIT_RANK[units[index]]
+        ):
+            units[index] = unit
+            found_in_field[index] = field
+    return units
 
-def search_products(query: str) -> Dict[str, Any]:
+async def search_products(query: str, client: httpx.AsyncClient, limit: int = 50) -> Dict[str, Any]:
     """
     Search for products using the Woolworths API.
     
     Args:
         query (str): The search query
+        client (httpx.AsyncClient): The shared HTTP client to issue the request on
+        limit (int, optional): Stop parsing once this many products are extracted. Defaults to 50.
     
     Returns:
         Dict[str, Any]: The search results
     """
+    cache_key = (query.lower().strip(), limit)
+    async with _search_cache_lock:
+        cached_results = _search_cache.get(cache_key)
+    if cached_results is not None:
+        return cached_results
+
     try:
         # Format the API URL
         url = format_api_url(query)
         
-        # Set up the headers
-        headers = {
-            "Accept": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        
         # Make the API request
-        response = requests.get(url, headers=headers)
+        async with _WOOL_SEM:
+            response = await client.get(url, headers=HEADERS)
         
         # Check if the request was successful
         if response.status_code != 200:
@@ -66,99 +170,85 @@ def search_products(query: str) -> Dict[str, Any]:
                 "response_text": response.text
             }
         
-        # Parse the JSON response
-        response_data = response.json()
+        # Decoded body; httpx has already undone any gzip transfer encoding
+        body = response.content
         
-        # Extract and format the products
-        products = []
-        # The outer "Products" key in response_data contains a list of product categories/groups.
+        # The outer "Products" key in the response contains a list of product categories/groups.
         # Each category/group then has its own "Products" key containing a list of actual products.
-        if "Products" in response_data and response_data["Products"]:
-            for product_category in response_data.get("Products", []): # product_category is a dict
-                actual_product_list = product_category.get("Products")
+        if ijson is not None and len(body) > STREAM_PARSE_THRESHOLD:
+            # Large response: stream just the product groups and skip facets, banners and other metadata
+            product_categories = ijson.items(body, "Products.item", use_float=True)
+        else:
+            # Parse the JSON response straight from the raw bytes
+            product_categories = _json_loads(body).get("Products") or []
+        
+        # Extract product information, then classify units for the whole batch at once
+        names = []
+        prices = []
+        api_units = []
+        unit_fields = []
+        for product_category in product_categories: # product_category is a dict
+            if len(names) >= limit:
+                break
+            actual_product_list = product_category.get("Products")
+            
+            if type(actual_product_list) is list:
+                pass # Common case: a category/group wrapping its products
+            elif "Stockcode" in product_category and "Products" not in product_category:
+                # Handle cases where product_category might be a product itself (e.g. direct search hit or promotion)
+                actual_product_list = (product_category,) # Treat the category as a single product list
+            else:
+                # If it's not a list and not a product-like dict, skip it.
+                # print(f"Skipping product_category due to unexpected structure: {product_category.get('Name')}")
+                continue
+
+            for product in actual_product_list: # This 'product' is the actual product item
                 
-                if not isinstance(actual_product_list, list):
-                    # Handle cases where product_category might be a product itself (e.g. direct search hit or promotion)
-                    if isinstance(product_category, dict) and "Stockcode" in product_category and "Products" not in product_category:
-                        actual_product_list = [product_category] # Treat the category as a single product list
-                    else:
-                        # If it's not a list and not a product-like dict, skip it.
-                        # print(f"Skipping product_category due to unexpected structure: {product_category.get('Name')}")
-                        continue
-
-                for product in actual_product_list: # This 'product' is the actual product item
-                    
-                    # Extract product information
-                    name = product.get("DisplayName", product.get("Name", ""))
-                    
-                    # Extract price information
-                    price = product.get("Price")
-                    if price is None:
-                        price = product.get("InstorePrice") # Check InstorePrice as well
-                    if price is None:
-                        price = product.get("WasPrice") # Fallback to WasPrice
-                    
-                    # Extract unit information
-                    unit = ""
-                    package_size_str = product.get("PackageSize", "")
-                    cup_string_str = product.get("CupString", "")
-                    cup_measure_str = product.get("CupMeasure", "")
-                    api_unit_field = product.get("Unit", "")
-
-                    # Priority 1: PackageSize
-                    if package_size_str and isinstance(package_size_str, str):
-                        ps_lower = package_size_str.lower()
-                        if "kg" in ps_lower: unit = "kg"
-                        elif "g" in ps_lower and "kg" not in ps_lower: unit = "g"
-                        elif "l" in ps_lower and "ml" not in ps_lower: unit = "L"
-                        elif "ml" in ps_lower: unit = "ml"
-                        elif "each" in ps_lower: unit = "each"
-                        elif "pack" in ps_lower or "pk" in ps_lower: unit = "pack"
-                    
-                    # Priority 2: CupString
-                    if not unit and cup_string_str and isinstance(cup_string_str, str):
-                        cs_lower = cup_string_str.lower()
-                        parts = cs_lower.split('/')
-                        target_str_for_unit = parts[-1].strip() if len(parts) > 1 else cs_lower
-
-                        if "kg" in target_str_for_unit: unit = "kg"
-                        elif "g" in target_str_for_unit and "kg" not in target_str_for_unit: unit = "g"
-                        elif "l" in target_str_for_unit and "ml" not in target_str_for_unit: unit = "L"
-                        elif "ml" in target_str_for_unit: unit = "ml"
-                        elif "each" in target_str_for_unit or "ea" in target_str_for_unit: unit = "each"
-                        elif "pack" in target_str_for_unit or "pk" in target_str_for_unit: unit = "pack"
-
-                    # Priority 3: CupMeasure
-                    if not unit and cup_measure_str and isinstance(cup_measure_str, str):
-                        cm_lower = cup_measure_str.lower()
-                        if "kg" in cm_lower: unit = "kg"
-                        elif "g" in cm_lower and "kg" not in cm_lower: unit = "g"
-                        elif "l" in cm_lower and "ml" not in cm_lower: unit = "L"
-                        elif "ml" in cm_lower: unit = "ml"
-                        elif "each" in cm_lower: unit = "each"
-                        elif "pack" in cm_lower or "pk" in cm_lower: unit = "pack"
-                    
-                    # Priority 4: API "Unit" field (often "Each")
-                    if not unit and api_unit_field and isinstance(api_unit_field, str):
-                        auf_lower = api_unit_field.lower()
-                        if "each" == auf_lower: # Exact match for "each"
-                            unit = "each"
-                        # Can add other specific unit mappings from api_unit_field if needed
+                # Extract product information
+                names.append(product.get("DisplayName", product.get("Name", "")))
                 
-                    # Add the product to the list
-                    products.append({
-                        "name": name,
-                        "price": float(price) if price is not None else None,
-                        "unit": unit,
-                        "store": STORE_NAME
-                    })
+                # Extract price information
+                price = product.get("Price")
+                if price is None:
+                    price = product.get("InstorePrice") # Check InstorePrice as well
+                if price is None:
+                    price = product.get("WasPrice") # Fallback to WasPrice
+                prices.append(price)
+                
+                # Extract unit information
+                cup_string_str = product.get("CupString", "")
+                if isinstance(cup_string_str, str):
+                    # CupString looks like "$1.20 / 100g"; the unit follows the slash
+                    cup_string_str = cup_string_str.rsplit('/', 1)[-1]
+                # Priority: PackageSize, CupString, CupMeasure
+                unit_fields.append((product.get("PackageSize", ""), cup_string_str, product.get("CupMeasure", "")))
+                api_units.append(product.get("Unit", ""))
+                if len(names) >= limit:
+                    break
         
-        return {
+        products = []
+        for name, price, unit, api_unit_field in zip(names, prices, _classify_units(unit_fields), api_units):
+            # Last resort: API "Unit" field (often "Each")
+            if not unit and isinstance(api_unit_field, str) and api_unit_field.lower() == "each":
+                unit = "each"
+            
+            # Add the product to the list
+            products.append(Product(
+                name=name,
+                price=float(price) if price is not None else None,
+                unit=unit,
+                store=STORE_NAME
+            ))
+    
+        search_results = {
             "status": "success",
             "query": query,
             "products": products,
             "product_count": len(products)
         }
+        async with _search_cache_lock:
+            _search_cache[cache_key] = search_results
+        return search_results
     except Exception as e:
         return {
             "status": "error",
@@ -192,6 +282,10 @@ woolworths_store = {
     "parse_price": parse_price
 }
 
+async def _main(query: str) -> Dict[str, Any]:
+    async with httpx.AsyncClient(http2=True) as client:
+        return await search_products(query, client)
+
 if __name__ == "__main__":
     # Example search query
     query = "milk"
@@ -201,7 +295,7 @@ if __name__ == "__main__":
     print(f"Store Info: {store_info}")
     
     # Search for products
-    search_results = search_products(query)
+    search_results = asyncio.run(_main(query))
     
     # Extract products from search results
     products = search_results.get("products", [])
@@ -212,7 +306,7 @@ if __name__ == "__main__":
     
     # Print each product
     for product in products:
-        print(f"\nProduct: {product['name']}")
-        print(f"Price: ${product['price']:.2f}" if product['price'] else "Price: N/A")
-        print(f"Unit: {product['unit']}")
-        print(f"Store: {product['store']}")
\ No newline at end of file
+        print(f"\nProduct: {product.name}")
+        print(f"Price: ${product.price:.2f}" if product.price else "Price: N/A")
+        print(f"Unit: {product.unit}")
+        print(f"Store: {product.store}")
\ No newline at end of file